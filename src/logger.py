@@ -1,7 +1,15 @@
-import asyncio
+import atexit
+import functools
+import io
+import itertools
 import logging
 import logging.handlers
 import os
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from uuid import uuid4
 from filelock import FileLock
 from src.config import ROOT_DIR
 
@@ -20,7 +28,72 @@ ENV_LOG_LEVEL = "LOG_LEVEL"
 # デフォルトログレベル
 DEFAULT_LOG_LEVEL = logging.INFO
 
-os.makedirs(LOG_DIR, exist_ok=True)
+# 環境変数から解決したログレベル（モジュール読み込み時に一度だけ解決する）
+# 不正な値や未設定の場合は getattr() で DEFAULT_LOG_LEVEL に変換
+_RESOLVED_LEVEL = getattr(
+    logging, (os.getenv(ENV_LOG_LEVEL) or "").upper(), DEFAULT_LOG_LEVEL
+)
+
+# 本モジュールで構築したロガー（set_log_levelでの一括変更用）
+_CONFIGURED_LOGGERS: list[logging.Logger] = []
+
+# これまでに構築したロガーがプロセス名／スレッド名を要求したか
+# （logging.logProcesses等はプロセス全体のフラグのため、1つでも要求した
+# ロガーがあれば収集を止めないようにする）
+_PROCESS_NAME_WANTED = False
+_THREAD_NAME_WANTED = False
+
+
+def _build_fmt_table() -> dict[tuple[bool, bool, bool], str]:
+    """
+    出力フラグの全組み合わせに対応するフォーマット文字列を構築する.
+
+    (out_process_name, out_thread_name, out_task_id) は高々8通りしか
+    ないため、モジュール読み込み時に全組み合わせを部分評価しておき、
+    ロガー構築時は辞書引きだけで済ませる。
+    """
+    table = {}
+    for pn, tn, ti in itertools.product((False, True), repeat=3):
+        parts = ["%(asctime)s"]
+
+        # プロセス名・スレッド名の出力を制御
+        if pn and tn:
+            parts.append(" [%(processName)s:%(threadName)s]")
+        elif pn:
+            parts.append(" [%(processName)s]")
+        elif tn:
+            parts.append(" [%(threadName)s]")
+
+        # タスクIDの出力を制御
+        if ti:
+            parts.append("[%(task_id)s]")
+
+        parts.extend(
+            [
+                "[%(name)s]",
+                "[%(levelname)s]",
+                " %(message)s",
+            ]
+        )
+        table[(pn, tn, ti)] = "".join(parts)
+    return table
+
+
+# フラグの組み合わせ → フォーマット文字列の変換テーブル
+_FMT_TABLE = _build_fmt_table()
+
+# ログレコード受け渡し用のプロセス内キュー（サイズ無制限）
+_LOG_QUEUE: queue.Queue = queue.Queue(-1)
+
+# ファイル書き込みを担当する常駐リスナー（プロセス内で1つだけ起動）
+_LISTENER: logging.handlers.QueueListener | None = None
+_LISTENER_LOCK = threading.Lock()
+
+# 書き込みバッファーのサイズ
+_WRITE_BUFFER_SIZE = 64 * 1024
+
+# バッファーをディスクへ書き出す間隔（秒）
+_FLUSH_INTERVAL = 0.2
 
 
 # マルチプロセス対応ローテーションハンドラ
@@ -42,21 +115,151 @@ class SafeTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
     - .lock ファイルは一時的に生成されますが、サイズはほぼ 0バイト。
     - ローテーションは極めて短時間なので、他プロセスが「数ミリ秒〜数百ミリ秒待機」するだけ。
     - --reload 付きの Uvicorn でも安全に動作する。
+
+    ロックの範囲：
+    - ファイルロックを取るのは doRollover のみ。emit はロックフリーで、
+      毎レコードのロック取得コストを払わない。
+    - 通常の書き込みは追記モード（O_APPEND）で開いたストリームへの append
+      のため、複数プロセスが同じファイルへ書いてもOSレベルで直列化される。
+      ロックが必要なのはファイルの付け替えを行うローテーションだけ。
     """
 
+    def _open(self):
+        """
+        64KiBのバッファーを挟んだ追記モードのストリームを開く.
+
+        デフォルトのテキストモードバッファリングに任せず明示的な
+        BufferedWriter を使うことで、write() システムコールを
+        複数レコード分まとめて発行する。
+        """
+        # "a" は O_APPEND（WindowsではFILE_APPEND_DATA相当）で開くため、
+        # 書き込み位置の調整込みでOSが追記を直列化する。emit側での
+        # プロセス間ロックは不要（クラスdocstringの「ロックの範囲」参照）
+        raw = io.FileIO(self.baseFilename, "a")
+        return io.TextIOWrapper(
+            io.BufferedWriter(raw, buffer_size=_WRITE_BUFFER_SIZE),
+            encoding="utf-8",
+            write_through=False,
+        )
+
+    def emit(self, record):
+        """
+        ローテーション判定後、flushせずにレコードをバッファーへ書き込む.
+
+        flushはバックグラウンドの定期flush（_start_listener内で起動）、
+        ローテーション時、およびプロセス終了時にのみ行い、レコード毎の
+        write()システムコールをバッファーで集約する。
+        """
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            msg = self.format(record)
+            self.stream.write(msg + self.terminator)
+        except Exception:
+            self.handleError(record)
+
     def doRollover(self):
         """ファイルロックを使用して安全にローテーションを実行する."""
         # ファイルロックで競合を防止（他プロセスは待ち状態になる）
         with FileLock(LOCK_FILE):
+            # バッファーに残っているレコードを旧ファイルへ書き切ってから
+            # ローテーションする
+            self.flush()
             super().doRollover()
 
 
+def _start_listener() -> None:
+    """
+    ファイル書き込み用の QueueListener をプロセス内で一度だけ起動する.
+
+    呼び出し元スレッドには QueueHandler のみを割り当て、実際のファイルI/O
+    （SafeTimedRotatingFileHandler への emit）はリスナーの専用スレッドに
+    集約する。これにより logger.info() 等の呼び出しコストはキューへの
+    put だけになり、UIスレッドがディスク書き込みを待つことがなくなる。
+    """
+    global _LISTENER
+    with _LISTENER_LOCK:
+        if _LISTENER is not None:
+            return
+
+        # ログディレクトリは最初のロガー構築時に一度だけ作成する
+        # （モジュールimportだけではディスクに触れない）
+        os.makedirs(LOG_DIR, exist_ok=True)
+
+        # 日付単位のローテーションハンドラーを使用
+        fh = SafeTimedRotatingFileHandler(
+            LOG_FILE,
+            when="midnight",  # 毎日午前0時にローテーション
+            interval=1,  # 1日間隔
+            backupCount=365,  # 365日分のログを保持
+            encoding="utf-8",
+            delay=True,  # ファイルをすぐ開かず、最初のログ出力時に開く（FD確保を遅延）
+        )
+
+        # レコードは QueueHandler 側（呼び出し元）で整形済みのため、
+        # リスナー側ではそのまま書き出すだけでよい
+        fh.setFormatter(logging.Formatter("%(message)s"))
+
+        _LISTENER = logging.handlers.QueueListener(
+            _LOG_QUEUE, fh, respect_handler_level=True
+        )
+        _LISTENER.start()
+
+        # バッファーに溜まったレコードを定期的にディスクへ書き出す
+        def _flush_loop():
+            while True:
+                time.sleep(_FLUSH_INTERVAL)
+                try:
+                    fh.flush()
+                except Exception:
+                    # ストリームが閉じられた後（プロセス終了時）は抜ける
+                    return
+
+        threading.Thread(
+            target=_flush_loop, name="log-flusher", daemon=True
+        ).start()
+
+        # プロセス終了時にキューを出し切ってから停止する
+        # （バッファーの最終flushはlogging.shutdownのハンドラーclose時に行われる）
+        atexit.register(_LISTENER.stop)
+
+
+# ログ相関用のタスク／リクエストID
+# （ContextVarはawaitをまたいで維持され、asyncioタスク外の同期コードでも使える）
+_task_id_var: ContextVar[str] = ContextVar("task_id", default="NoTask")
+
+
+def set_task_id(task_id: str | None = None) -> str:
+    """
+    現在のコンテキストにログ相関用のタスクIDを設定する.
+
+    リクエストの起点（FastAPIのミドルウェア等）で呼び出すことを想定。
+    以降そのコンテキストで出力されるログレコードすべてに同じIDが付く。
+
+    Args:
+        task_id: 設定するID（省略時は8桁の短縮UUIDを自動採番）
+
+    Returns:
+        設定されたID
+    """
+    if task_id is None:
+        task_id = uuid4().hex[:8]
+    _task_id_var.set(task_id)
+    return task_id
+
+
 class TaskIdFilter(logging.Filter):
     """
     ログレコードにタスクIDを追加するフィルター.
 
-    asyncioタスクのIDを自動的にログレコードに追加します。
-    asyncioタスク外で実行された場合は "NoTask" を設定します。
+    set_task_id で設定されたログ相関用IDをログレコードに追加します。
+    未設定のコンテキストでは "NoTask" を設定します。
+
+    ContextVar.get() は1回の辞書引きで済むため、レコード毎に
+    asyncio.current_task() を呼んでタスクを特定するより安価で、
+    イベントループ外での RuntimeError 対応も不要になります。
     """
 
     def filter(self, record: logging.LogRecord) -> bool:
@@ -69,17 +272,7 @@ class TaskIdFilter(logging.Filter):
         Returns:
             常にTrue（ログを通過させる）
         """
-        try:
-            task = asyncio.current_task()
-            if task:
-                # タスクIDを16進数の短縮版（末尾8桁）で取得
-                record.task_id = f"{id(task):x}"[-8:]
-            else:
-                record.task_id = "NoTask"
-        except RuntimeError:
-            # asyncioイベントループが実行されていない場合
-            record.task_id = "NoTask"
-
+        record.task_id = _task_id_var.get()
         return True
 
 
@@ -133,68 +326,143 @@ def get_logger(
         >>> logger.info("メッセージ")
         # 出力: 2025-11-13 10:00:00,000 [TaskID: 1a2b3c4d][module][INFO] - メッセージ
     """
-    logger = logging.getLogger(name)
+    # 同一の引数での再呼び出し（Streamlitの再実行等）は、ハンドラー構成を
+    # 確認することなくキャッシュから即座に返す
+    return _build_logger(name, out_process_name, out_thread_name, out_task_id)
 
-    # 環境変数からログレベルを取得（未設定の場合は空文字列に変換）
-    # 不正な値や空文字列の場合は getattr() で logging.INFO に変換
-    log_level_str = (os.getenv(ENV_LOG_LEVEL) or "").upper()
-    log_level = getattr(logging, log_level_str, DEFAULT_LOG_LEVEL)
 
-    # 既にハンドラが設定されている場合は再設定せず、そのまま返す
-    if logger.handlers:
-        logger.setLevel(log_level)  # ロガーのレベルを更新
-        for handler in logger.handlers:
-            handler.setLevel(log_level)  # ハンドラーのレベルも更新
+class CachedTimeFormatter(logging.Formatter):
+    """
+    asctimeの整形結果を秒単位でキャッシュするフォーマッター.
+
+    stdlibのFormatter.formatTimeはレコード毎に time.localtime() と
+    time.strftime() を呼ぶが、秒精度の文字列は同一秒内のレコードで
+    すべて同じになる。直近の秒とその整形結果をキャッシュし、
+    秒が変わったときだけ strftime を実行する。
+    （複数スレッドから同時に呼ばれても、最悪で再計算が起きるだけで
+    結果は正しい）
+    """
+
+    _last_sec = 0
+    _last_str = ""
+
+    def formatTime(self, record, datefmt=None):
+        """レコードの作成時刻を整形する（秒部分はキャッシュを使用）."""
+        if datefmt:
+            # 明示的なフォーマット指定時はキャッシュせず通常処理
+            return super().formatTime(record, datefmt)
+
+        sec = int(record.created)
+        if sec != CachedTimeFormatter._last_sec:
+            CachedTimeFormatter._last_sec = sec
+            CachedTimeFormatter._last_str = time.strftime(
+                self.default_time_format, time.localtime(sec)
+            )
+        return f"{CachedTimeFormatter._last_str},{int(record.msecs):03d}"
+
+
+@functools.lru_cache(maxsize=8)
+def _formatter_for(
+    out_process_name: bool,
+    out_thread_name: bool,
+    out_task_id: bool,
+) -> logging.Formatter:
+    """
+    出力フラグの組み合わせに対応するフォーマッターを構築する.
+
+    フラグの組み合わせは高々8通りしかないため、フォーマット文字列は
+    _FMT_TABLE から辞書引きし、構築済みフォーマッターをキャッシュして
+    使い回す（Formatterの生成はフォーマット文字列の検証を伴うため、
+    validate=False と合わせて再構築コストを省く）。
+    """
+    fmt = _FMT_TABLE[(out_process_name, out_thread_name, out_task_id)]
+    return CachedTimeFormatter(fmt, validate=False)
+
+
+@functools.lru_cache(maxsize=None)
+def _build_logger(
+    name: str,
+    out_process_name: bool,
+    out_thread_name: bool,
+    out_task_id: bool,
+) -> logging.Logger:
+    """ロガーを構築する（get_loggerの内部実装）."""
+    logger = logging.getLogger(name)
+
+    # 本モジュール製のハンドラーが既に付いている場合は再設定せず、そのまま返す。
+    # ハンドラーの有無ではなく目印属性で判定することで、同名ロガーに対して
+    # 別の経路（別モジュールのコピー等）からget_loggerが呼ばれても
+    # ハンドラーが二重に付与されない（＝同一レコードの二重書き込みを防ぐ）。
+    # （レベルの実行時変更は set_log_level で明示的に行う）
+    if any(getattr(h, "_rag_ui_handler", False) for h in logger.handlers):
         return logger
 
+    log_level = _RESOLVED_LEVEL
     logger.setLevel(log_level)
 
-    # 日付単位のローテーションハンドラーを使用
-    fh = SafeTimedRotatingFileHandler(
-        LOG_FILE,
-        when="midnight",  # 毎日午前0時にローテーション
-        interval=1,  # 1日間隔
-        backupCount=365,  # 365日分のログを保持
-        encoding="utf-8",
-        delay=True,  # ファイルをすぐ開かず、最初のログ出力時に開く
-    )
+    # 出力しないフィールドはLogRecord生成時の収集自体を止める。
+    # stdlibはフォーマットに関係なく毎レコードで current_process() /
+    # current_thread() を呼ぶため、不要なら省略して生成コストを下げる。
+    # 注意: これらはプロセス全体に効くグローバルフラグのため、
+    # どれかのロガーが一度でも要求したフィールドは無効化しない。
+    global _PROCESS_NAME_WANTED, _THREAD_NAME_WANTED
+    if out_process_name:
+        _PROCESS_NAME_WANTED = True
+        logging.logProcesses = True
+        logging.logMultiprocessing = True
+    elif not _PROCESS_NAME_WANTED:
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+    if out_thread_name:
+        _THREAD_NAME_WANTED = True
+        logging.logThreads = True
+    elif not _THREAD_NAME_WANTED:
+        logging.logThreads = False
+
+    # ファイルI/Oはリスナースレッドに任せ、呼び出し元にはキュー投入のみの
+    # ハンドラーを割り当てる（整形・フィルターは呼び出し元コンテキストで実行）
+    fh = logging.handlers.QueueHandler(_LOG_QUEUE)
     fh.setLevel(log_level)
+    # 重複付与防止の目印（上の判定で使用）
+    fh._rag_ui_handler = True
 
     # タスクIDフィルターを追加
     if out_task_id:
         fh.addFilter(TaskIdFilter())
 
-    # フォーマットを動的に構築
-    format_parts = [
-        "%(asctime)s",
-    ]
-
-    # プロセス名・スレッド名の出力を制御
-    if out_process_name and out_thread_name:
-        format_parts.append(" [%(processName)s:%(threadName)s]")
-    elif out_process_name:
-        format_parts.append(" [%(processName)s]")
-    elif out_thread_name:
-        format_parts.append(" [%(threadName)s]")
-
-    # タスクIDの出力を制御
-    if out_task_id:
-        format_parts.append("[%(task_id)s]")
-
-    format_parts.extend(
-        [
-            "[%(name)s]",
-            "[%(levelname)s]",
-            " %(message)s",
-        ]
-    )
-
-    formatter = logging.Formatter("".join(format_parts))
-    fh.setFormatter(formatter)
+    fh.setFormatter(_formatter_for(out_process_name, out_thread_name, out_task_id))
 
     logger.addHandler(fh)
 
+    # ファイル書き込み用リスナーを（未起動なら）起動する
+    _start_listener()
+
     # ルートロガーへの伝播を無効化（親ロガーのハンドラーによる重複出力を防止）
     logger.propagate = False
 
+    _CONFIGURED_LOGGERS.append(logger)
+
     return logger
+
+
+def set_log_level(level: int | str) -> None:
+    """
+    本モジュールで構築した全ロガーのログレベルを実行時に変更する.
+
+    get_logger はモジュール読み込み時に解決したレベルを使うため、
+    実行中にレベルを切り替えたい場合はこの関数を使用する。
+
+    Args:
+        level: ログレベル（logging.DEBUG 等の定数、または "DEBUG" 等の文字列）
+    """
+    global _RESOLVED_LEVEL
+
+    if isinstance(level, str):
+        level = getattr(logging, level.upper(), DEFAULT_LOG_LEVEL)
+
+    _RESOLVED_LEVEL = level
+
+    for logger in _CONFIGURED_LOGGERS:
+        logger.setLevel(level)
+        for handler in logger.handlers:
+            handler.setLevel(level)
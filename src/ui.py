@@ -1,9 +1,12 @@
 # app_ui.py
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from src.config import API_BASE_URL
 from src.logger import get_logger
@@ -11,12 +14,74 @@ from src.logger import get_logger
 # ロガー設定
 logger = get_logger(__name__)
 
+# APIサーバへの接続を使い回すセッション
+# （requests.post/get をその都度呼ぶとTCP接続の張り直しが毎回発生するため、
+# コネクションプール付きのセッションをモジュールレベルで1つだけ作る）
+_SESSION = requests.Session()
+_SESSION.mount(
+    "http://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+)
+
 logger.info("=== SERVER STARTED ===")
 logger.info("sys.executable: %s", sys.executable)
 logger.info("sys.prefix: %s", sys.prefix)
 logger.info("PATH: %s", os.environ.get("PATH"))
 
 
+# API接続確認結果をキャッシュする秒数
+_HEALTH_CHECK_TTL = 5.0
+
+# API接続確認を裏で実行するスレッドプール（確認は直列で1本あれば十分）
+_PROBE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-probe")
+
+
+def _probe_api() -> dict:
+    """APIサーバの /docs へ疎通確認を行い、結果を辞書で返す."""
+    try:
+        response = _SESSION.get(f"{API_BASE_URL}/docs", timeout=10)
+        result = {
+            "ok": response.status_code == 200,
+            "status_code": response.status_code,
+        }
+        if not result["ok"]:
+            logger.info(
+                "AIエージェントサーバーとの接続に問題があります。status_code: %s",
+                response.status_code,
+            )
+    except Exception as e:
+        result = {"ok": False, "error": str(e)}
+        logger.error("エラーが発生しました: %s", e)
+    return result
+
+
+def _check_api_health() -> dict | None:
+    """
+    APIサーバの接続状態を返す（確認は裏スレッド、結果はTTL付きでキャッシュ）.
+
+    Streamlitはウィジェット操作のたびにスクリプト全体を再実行するため、
+    その場でHTTP GETを発行すると操作ごとにネットワーク往復で描画がブロックされる。
+    初回やTTL切れ時は接続確認をスレッドプールへ投げ、完了を待たずに前回の
+    結果（なければ None）を返す。完了した確認結果は次回の再実行時に
+    st.session_state へ取り込まれる。
+    """
+    now = time.monotonic()
+    cache = st.session_state.get("_api_health")
+    future = st.session_state.get("_api_health_future")
+
+    # 裏スレッドでの確認が完了していれば結果を取り込む
+    if future is not None and future.done():
+        cache = {"t": now, **future.result()}
+        st.session_state["_api_health"] = cache
+        st.session_state["_api_health_future"] = None
+        future = None
+
+    # 初回またはTTL切れなら、次の確認を裏スレッドへ投げる（完了は待たない）
+    if future is None and (cache is None or now - cache["t"] > _HEALTH_CHECK_TTL):
+        st.session_state["_api_health_future"] = _PROBE_POOL.submit(_probe_api)
+
+    return cache
+
+
 def show_message(message: BaseMessage) -> None:
     """
     画面に会話履歴を表示
@@ -28,21 +93,36 @@ def show_message(message: BaseMessage) -> None:
         st.chat_message("ai").write(message.content)
 
 
+def show_history() -> None:
+    """
+    会話履歴を1つのコンテナにまとめて表示.
+
+    履歴全体を単一コンテナ配下の固定位置に描画することで、Streamlitの
+    要素差分検出が変化のないメッセージをそのまま使い回せるようにする。
+    （Streamlitは操作のたびにスクリプト全体を再実行するため、過去メッセージを
+    描画対象から外すと画面から消えてしまう。省略できるのは差分送信であって
+    描画呼び出しではない点に注意）
+    """
+    with st.container():
+        for message in st.session_state.messages:
+            show_message(message)
+
+
 def query_api(query: str) -> str:
     """
     FastAPIエンドポイントにHTTPリクエストを送信して回答を取得
     """
     try:
-        logger.info(f"APIサーバへクエリ送信: {query}")
-        response = requests.post(
+        logger.info("APIサーバへクエリ送信: %s", query)
+        response = _SESSION.post(
             f"{API_BASE_URL}/query", json={"query": query}, timeout=120
         )
         response.raise_for_status()
         result = response.json()
-        logger.info(f"APIサーバからの戻り値: {result}")
+        logger.info("APIサーバからの戻り値: %s", result)
         return result["answer"]
     except Exception as e:
-        logger.error(f"エラーが発生しました: {e}")
+        logger.error("エラーが発生しました: %s", e)
         return f"エラーが発生しました: {str(e)}"
 
 
@@ -50,28 +130,24 @@ def app():
     # 1. タイトルとAPI接続状況を表示
     st.title("業務上の質問に回答します！")
 
-    # API接続確認
-    try:
-        response = requests.get(f"{API_BASE_URL}/docs", timeout=10)
-        if response.status_code == 200:
-            st.sidebar.success("✅ AIエージェントサーバーに接続されています")
-        else:
-            st.sidebar.warning("⚠️ AIエージェントサーバーとの接続に問題があります")
-            logger.info(
-                f"AIエージェントサーバーとの接続に問題があります。status_code: {response.status_code}"
-            )
-    except Exception as e:
+    # API接続確認（裏スレッドで実行され、結果はTTL付きでキャッシュされる）
+    health = _check_api_health()
+    if health is None:
+        st.sidebar.info("⏳ AIエージェントサーバーへの接続を確認中です…")
+    elif health["ok"]:
+        st.sidebar.success("✅ AIエージェントサーバーに接続されています")
+    elif "status_code" in health:
+        st.sidebar.warning("⚠️ AIエージェントサーバーとの接続に問題があります")
+    else:
         st.sidebar.error("❌ AIエージェントサーバーに接続できません")
         st.sidebar.info(
             "AIエージェントサーバーを起動してください:\n```\nuvicorn rag_api:app --reload\n```"
         )
-        logger.error(f"エラーが発生しました: {e}")
 
     # 2. ここまでの会話履歴を表示
     if "messages" not in st.session_state:
         st.session_state.messages = []
-    for message in st.session_state.messages:
-        show_message(message)
+    show_history()
 
     # 3. ユーザーの入力を受け付け
     if user_input := st.chat_input():
@@ -80,13 +156,14 @@ def app():
         st.session_state.messages.append(HumanMessage(content=user_input))
 
         # 4. APIエンドポイントに質問を送信して回答を取得
-        with st.chat_message("ai"):
-            with st.spinner("回答を生成中..."):
-                answer = query_api(user_input)
-            st.write(answer)
+        with st.spinner("回答を生成中..."):
+            answer = query_api(user_input)
 
-        # AIの回答を保存
+        # AIの回答を保存し、再実行して描画は履歴表示（show_history）に一本化する
+        # （ここで chat_message("ai") を直接描画すると、次の再実行で同じ
+        # メッセージがもう一度描画され、1回答につき2回描画することになる）
         st.session_state.messages.append(AIMessage(content=answer))
+        st.rerun()
 
 
 if __name__ == "__main__":